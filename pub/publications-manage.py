@@ -3,8 +3,8 @@
 
 import re
 import os
+import csv
 from glob import glob
-from pandas import DataFrame
 from collections import defaultdict
 from datetime import date
 from argparse import ArgumentParser
@@ -20,6 +20,25 @@ parser = BibTexParser(common_strings=True)
 parser.ignore_nonstandard_types = False
 parser.homogenise_fields = True
 
+# authors to highlight
+SPECIAL = ["Heinrich, Philipp", "Heinrich, P."]
+
+# precompiled patterns
+_RE_NEWLINES = re.compile(r"\n+")
+_RE_BRACES = re.compile(r"[{}]")
+_RE_PAGES = re.compile(r"\s*[-–]+\s*")
+_RE_SHAREDTASK = re.compile(r"shared\s?task", re.IGNORECASE)
+_RE_NAMES = re.compile(
+    " and |" + "|".join(re.escape(s) for s in SPECIAL)
+)
+_RE_UNESCAPE = re.compile(r"``|''|\\_|\\&")
+_UNESCAPE = {
+    "``": "&ldquo;",
+    "''": "&rdquo;",
+    r"\_": "_",
+    r"\&": "&"
+}
+
 
 # TODO: consistencize @misc (howpublished, address, type of presentation)
 # TODO: consistencize @inproceedings (location / address)
@@ -35,36 +54,35 @@ def formatter(entry):
         if type(entry[key]) is str:
 
             # remove newlines from values
-            value = re.sub("\n+", " ", entry[key])
+            value = _RE_NEWLINES.sub(" ", entry[key])
             entry[key] = value
 
         if key == 'title' or key == 'booktitle':
 
             # capitalize words to avoid NATBIB "feature"
-            row = re.sub("{|}", "", entry[key])
-            row = row.split(" ")
+            # (words that already contain braces are kept as they are)
+            row = entry[key].split(" ")
             row = " ".join([
                 "{" + r + "}" if (
+                    "{" not in r and "}" not in r and
                     any(x.isupper() for x in r)
                 ) else r for r in row
             ])
             entry[key] = row
 
         if key == 'pages':
-            row = re.sub(r"\s*[-–]+\s*", "-", entry[key])
-            row = re.sub("-", "–", row)
-            entry[key] = row
+            entry[key] = _RE_PAGES.sub("–", entry[key])
 
     return entry
 
 
-def author2html(author, special=["Heinrich, Philipp", "Heinrich, P."]):
-    """ format authors HTML-style """
+def author2html(author):
+    """ format authors HTML-style (SPECIAL authors are underlined) """
 
-    author = author.replace(" and ", "; ")
-    for s in special:
-        author = author.replace(s, "<u>" + s + "</u>")
-    return author
+    return _RE_NAMES.sub(
+        lambda m: "; " if m.group(0) == " and " else "<u>" + m.group(0) + "</u>",
+        author
+    )
 
 
 def article2html(entry):
@@ -75,17 +93,14 @@ def article2html(entry):
     style: author (year). <b>title</b>. <i>journal</i> <b>volume</b>(issue)?: pages.
     """
 
-    volume_number = "<b>" + entry['volume'] + "</b>"
-    if "number" in entry.keys():
-        volume_number += "(" + entry['number'] + ")"
-    return " ".join([
-        author2html(entry['author']),
-        "(" + entry['year'] + ").",
-        "<b>" + entry['title'] + "</b>.",
-        "<i>" + entry['journal'] + "</i>",
-        volume_number + ":",
-        entry['pages'] + "."
-    ])
+    number = f"({entry['number']})" if "number" in entry else ""
+    return (
+        f"{author2html(entry['author'])} ({entry['year']}). "
+        f"<b>{entry['title']}</b>. "
+        f"<i>{entry['journal']}</i> "
+        f"<b>{entry['volume']}</b>{number}: "
+        f"{entry['pages']}."
+    )
 
 
 def book2html(entry):
@@ -103,18 +118,15 @@ def book2html(entry):
     style:  author / editor (year). <b>title</b>. address: publisher.
     """
 
-    if "author" in entry.keys():
-        author = author2html(entry['author'])
-    elif "editor" in entry.keys():
-        author = author2html(entry['editor'])
+    author = author2html(
+        entry['author'] if "author" in entry else entry['editor']
+    )
 
-    return " ".join([
-        author,
-        "(" + entry['year'] + ").",
-        "<b>" + entry['title'] + "</b>.",
-        entry['address'] + ":",
-        entry['publisher'] + "."
-    ])
+    return (
+        f"{author} ({entry['year']}). "
+        f"<b>{entry['title']}</b>. "
+        f"{entry['address']}: {entry['publisher']}."
+    )
 
 
 def inproceedings2html(entry):
@@ -126,14 +138,13 @@ def inproceedings2html(entry):
     style: author (year). <b>title</b>. 'In' <i>booktitle</i>, 'pages' pages, address.
     """
 
-    return " ".join([
-        author2html(entry['author']),
-        "(" + entry['year'] + ").",
-        "<b>" + entry['title'] + "</b>.",
-        "In <i>" + entry['booktitle'] + "</i>,",
-        "pages " + entry['pages'] + ",",
-        entry['address'] + "."
-    ])
+    return (
+        f"{author2html(entry['author'])} ({entry['year']}). "
+        f"<b>{entry['title']}</b>. "
+        f"In <i>{entry['booktitle']}</i>, "
+        f"pages {entry['pages']}, "
+        f"{entry['address']}."
+    )
 
 
 def incollection2html(entry):
@@ -146,16 +157,14 @@ def incollection2html(entry):
            'edited by' editor, 'pages' pages, address: publisher.
     """
 
-    return " ".join([
-        author2html(entry['author']),
-        "(" + entry['year'] + ").",
-        "<b>" + entry['title'] + "</b>.",
-        "In <i>" + entry['booktitle'] + "</i>,",
-        "edited by " + author2html(entry['editor']) + ",",
-        "pages " + entry['pages'] + ",",
-        entry['address'] + ":",
-        entry['publisher'] + "."
-    ])
+    return (
+        f"{author2html(entry['author'])} ({entry['year']}). "
+        f"<b>{entry['title']}</b>. "
+        f"In <i>{entry['booktitle']}</i>, "
+        f"edited by {author2html(entry['editor'])}, "
+        f"pages {entry['pages']}, "
+        f"{entry['address']}: {entry['publisher']}."
+    )
 
 
 def misc2html(entry):
@@ -166,16 +175,17 @@ def misc2html(entry):
     style: author (month, year). <b>title</b>. <i>howpublished</i>.
     """
 
-    return " ".join([
-        author2html(entry['author']),
-        "(" + entry['year'] + ").",
-        "<b>" + entry['title'] + "</b>.",
-        "<i>" + entry['howpublished'] + "</i>."
-    ])
+    return (
+        f"{author2html(entry['author'])} ({entry['year']}). "
+        f"<b>{entry['title']}</b>. "
+        f"<i>{entry['howpublished']}</i>."
+    )
 
 
-def bibtex2html(entry, pdf_dir):
-    """ converts an entry to HTML """
+def bibtex2html(entry, pdf_dir, pdf_files):
+    """ converts an entry to HTML
+    pdf_files: names of files in pdf_dir
+    """
 
     out = None
 
@@ -210,37 +220,33 @@ def bibtex2html(entry, pdf_dir):
         raise NotImplementedError("can't deal with this")
 
     # remove capitalizers
-    out = re.sub("{|}", "", out)
+    out = _RE_BRACES.sub("", out)
 
     # links ############################
-    out += " ["
 
     # bib
-    out += '<a href="%s">bib</a>' % "/".join(["bib", entry['ID'] + ".bib"])
+    links = ['<a href="%s">bib</a>' % "/".join(["bib", entry['ID'] + ".bib"])]
 
     # website
-    if 'url' in entry.keys():
-        out += ', <a href="%s">web</a>' % entry['url']
+    if 'url' in entry:
+        links.append('<a href="%s">web</a>' % entry['url'])
 
     # PDFs
     res = {
-        'abstract': pdf_dir + entry['ID'] + "_abstract.pdf",
-        'pdf': pdf_dir + entry['ID'] + ".pdf",
-        'slides': pdf_dir + entry['ID'] + "_slides.pdf",
-        'poster': pdf_dir + entry['ID'] + "_poster.pdf"
+        'abstract': entry['ID'] + "_abstract.pdf",
+        'pdf': entry['ID'] + ".pdf",
+        'slides': entry['ID'] + "_slides.pdf",
+        'poster': entry['ID'] + "_poster.pdf"
     }
 
     for key in ['abstract', 'pdf', 'slides', 'poster']:
-        if os.path.isfile(res[key]):
-            out += ', <a href="%s">%s</a>' % (res[key], key)
+        if res[key] in pdf_files:
+            links.append('<a href="%s">%s</a>' % (pdf_dir + res[key], key))
 
-    out += "]\n"
+    out = "".join([out, " [", ", ".join(links), "]\n"])
 
     # unescape stuff ###################
-    out = out.replace("``", "&ldquo;")
-    out = out.replace("''", "&rdquo;")
-    out = out.replace(r"\_", "_")
-    out = out.replace(r"\&", "&")
+    out = _RE_UNESCAPE.sub(lambda m: _UNESCAPE[m.group(0)], out)
 
     return out
 
@@ -249,13 +255,14 @@ def read_many_bibs(paths_in, consistencize=True):
 
     # READ many bibs, convert to str
     paths_in.sort()
-    txt_list = str()
+    chunks = list()
     for p in paths_in:
         with open(p, "rt", encoding='utf-8') as f:
             try:
-                txt_list += f.read() + "\n"
+                chunks.append(f.read())
             except UnicodeDecodeError:
                 print(p)
+    txt_list = "\n".join(chunks) + "\n"
 
     # read all bib strings
     db = bibtexparser.loads(txt_list, parser)
@@ -277,26 +284,23 @@ def read_many_bibs(paths_in, consistencize=True):
     return db
 
 
-def order_db(db, order="ENTRYTYPE"):
+def order_db(db):
+    """ groups entries by ENTRYTYPE and date in a single pass:
+    col[entrytype][date] -> list of entries
+    """
 
-    col = defaultdict(BibDatabase)
+    col = defaultdict(lambda: defaultdict(list))
     for entry in db.entries:
 
-        if order == "ENTRYTYPE":
-            # special case: SharedTasks
-            if "note" in entry.keys() and re.search(
-                    r"shared\s?task", entry['note'].lower()
-            ):
-                col['sharedtask'].entries.append(entry)
-            else:
-                col[entry['ENTRYTYPE']].entries.append(entry)
-
-        if order == 'date':
-            if 'date' in entry.keys():
-                date = entry['date']
-            else:
-                date = entry['year']
-            col[date].entries.append(entry)
+        # special case: SharedTasks
+        if "note" in entry and _RE_SHAREDTASK.search(entry['note']):
+            entrytype = 'sharedtask'
+        else:
+            entrytype = entry['ENTRYTYPE']
+
+        date = entry['date'] if 'date' in entry else entry['year']
+
+        col[entrytype][date].append(entry)
 
     return col
 
@@ -307,19 +311,38 @@ def main(paths_in, pdf_dir, path_tsv, path_bib, path_html):
 
     db = read_many_bibs(paths_in)
 
-    # convert to .tsv
-    df = DataFrame(db.entries)
-    df.to_csv(path_tsv, sep="\t")
+    # list available PDFs once (none if pdf_dir does not exist)
+    pdf_files = {
+        e.name for e in os.scandir(pdf_dir) if e.is_file()
+    } if os.path.isdir(pdf_dir) else set()
+
+    # convert to .tsv (columns in order of first appearance, row index first)
+    fieldnames = list(dict.fromkeys(k for e in db.entries for k in e))
+    with open(path_tsv, 'wt', newline='', encoding='utf-8') as tsvfile:
+        tsvwriter = csv.writer(tsvfile, delimiter="\t", lineterminator="\n")
+        tsvwriter.writerow([""] + fieldnames)
+        tsvwriter.writerows(
+            [i] + [e.get(k, "") for k in fieldnames]
+            for i, e in enumerate(db.entries)
+        )
 
     # convert to .bib
     writer = BibTexWriter()
+    # entries are sorted by date (newest first), then by ID
+    writer.order_entries_by = None
     db_ordered = order_db(db)
+    parts = list()
+    for key in sorted(db_ordered.keys()):
+        parts.append("%" * 60 + "\n% " + key + "\n" + "%" * 60 + "\n")
+        db_ordered_dates = db_ordered[key]
+        db_type = BibDatabase()
+        db_type.entries = [
+            e for key2 in sorted(db_ordered_dates.keys(), reverse=True)
+            for e in sorted(db_ordered_dates[key2], key=lambda x: x['ID'])
+        ]
+        parts.append(writer.write(db_type))
     with open(path_bib, 'wt') as bibfile:
-        for key in sorted(db_ordered.keys()):
-            bibfile.write("%" * 60 + "\n% " + key + "\n" + "%" * 60 + "\n")
-            db_ordered_dates = order_db(db_ordered[key], 'date')
-            for key2 in sorted(db_ordered_dates.keys(), reverse=True):
-                bibfile.write(writer.write(db_ordered_dates[key2]))
+        bibfile.write("".join(parts))
 
     # convert to .html
     types = {
@@ -335,20 +358,21 @@ def main(paths_in, pdf_dir, path_tsv, path_bib, path_html):
     if len(set(db_ordered.keys()).union(set(types.keys()))) != len(types.keys()):
         raise ValueError
     # write
+    parts = ["<html>\n"]
+    for key in types.keys():
+        parts.append("<h3>" + types[key] + "</h3>\n")
+        db_ordered_dates = db_ordered[key]
+        parts.append("<ul>\n")
+        for key2 in sorted(db_ordered_dates.keys(), reverse=True):
+            for bib in db_ordered_dates[key2]:
+                parts.append("<li> " + bibtex2html(bib, pdf_dir, pdf_files))
+        parts.append("</ul>\n")
+    parts.append("<footer>\n")
+    parts.append("last update: " + date.today().strftime("%B %d, %Y") + "\n")
+    parts.append("</footer>\n")
+    parts.append("</html>")
     with open(path_html, 'wt') as htmlfile:
-        htmlfile.write("<html>\n")
-        for key in types.keys():
-            htmlfile.write("<h3>" + types[key] + "</h3>\n")
-            db_ordered_dates = order_db(db_ordered[key], 'date')
-            htmlfile.write("<ul>\n")
-            for key2 in sorted(db_ordered_dates.keys(), reverse=True):
-                for bib in db_ordered_dates[key2].entries:
-                    htmlfile.write("<li> " + bibtex2html(bib, pdf_dir))
-            htmlfile.write("</ul>\n")
-        htmlfile.write("<footer>\n")
-        htmlfile.write("last update: " + date.today().strftime("%B %d, %Y") + "\n")
-        htmlfile.write("</footer>\n")
-        htmlfile.write("</html>")
+        htmlfile.write("".join(parts))
 
 
 if __name__ == '__main__':